@@ -4,13 +4,12 @@
 # modified: 9/30/2017
 #  purpose: ChrmProf class. ChrmProf is a chromosome profile and contains a mutated chrm with
 #             references to the mutations' original position. Keeps track of copy numbers.
+#             Standard library only. Runs under CPython 2 or 3, but PyPy is preferred for large simulations.
 
 # imports
 import sys
-import copy
-import math
-import random
-import numpy as np
+import bisect
+import collections
 
 # helpers
 def printnow(s):
@@ -26,9 +25,9 @@ class ChrmProf:
 	def __init__(self, n):
 		self.n = n
 		self.org = _OrgNode(0, n - 1)
-		self.mut = _MutNode(0, n - 1)
+		self.mut = _MutNode(0, n - 1, parent = self.org)
 		self.org.children.append(self.mut)
-		self.mut.parent = self.org
+		self._index_muts()
 
 	# output: bgns (list of int) [n] beginning positions for each segment
 	#         ends (list of int) [n] ending positions for each segment
@@ -36,10 +35,11 @@ class ChrmProf:
 	def get_copy_nums(self):
 		cur = self.org
 		bgns, ends, cps = [], [], []
-		while cur != None:
-			bgns.append(cur.bgn)
-			ends.append(cur.end)
-			cps.append(len(cur.children))
+		bgns_append, ends_append, cps_append = bgns.append, ends.append, cps.append
+		while cur is not None:
+			bgns_append(cur.bgn)
+			ends_append(cur.end)
+			cps_append(len(cur.children))
 			cur = cur.r
 		return bgns, ends, cps
 
@@ -48,17 +48,12 @@ class ChrmProf:
 		n = self.n
 		svs = {}
 		cur = self.mut
-		while cur != None:
+		while cur is not None:
 			_add_sv_to_dict(svs, cur, True)
 			_add_sv_to_dict(svs, cur, False)
 			cur = cur.r
 		# remove any splits that are not actually breakpoints
-		keys_to_remove = []
-		for k, v in svs.items():
-			if 'mate' not in v:
-				keys_to_remove.append(k)
-		for k in keys_to_remove:
-			del svs[k]
+		svs = { k: v for k, v in svs.items() if 'mate' in v }
 		# add breakpoint copy numbers
 		_append_bp_copy_num(svs, self.mut)
 
@@ -69,91 +64,110 @@ class ChrmProf:
 		c.org, muts = _deepcopy_org(self.org)
 		muts = sorted(muts, key = lambda x: x.bgn)
 		n = len(muts)
-		for i in xrange(0, n):
+		for i in range(0, n):
 			if i != 0:
 				muts[i].l = muts[i-1]
 			if i != n-1:
 				muts[i].r = muts[i+1]
 		c.mut = muts[0]
+		c._index_muts()
 		return c
 
 	def inv(self, bgn, end):
 		if not self._is_in_bounds(bgn, end) or not self._is_splitable(bgn, end):
 			return False
-		self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
+		i, j = self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
+		self._rev_mut(i, j)
 
-		self._rev_mut(bgn, end)
+		# reversed region keeps its slot in the index
+		muts = self._muts
+		muts[i:j+1] = muts[i:j+1][::-1]
+		self._bgns[i:j+1] = [ m.bgn for m in muts[i:j+1] ]
 
 		return True
 
 	def rem(self, bgn, end):
 		if not self._is_in_bounds(bgn, end) or not self._is_splitable(bgn, end):
 			return False
-		self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
-
-		head, tail = _get_head_tail(self.mut, bgn, end)
+		i, j = self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
+		head, tail = self._muts[i], self._muts[j]
 
 		newL = head.l
 		newR = tail.r
 
-		if newL == None:
+		if newL is None:
 			self.mut = newR # change the head of the mut list to right of tail if we are removing head -> tail
-		if newL != None:
+		if newL is not None:
 			newL.r = newR
-		if newR != None:
+		if newR is not None:
 			newR.l = newL
 		head.l = None
 		tail.r = None
 
-		# remove old nodes from OrgNode children list and delete old nodes
-		while head != None:
-			head.parent.children.remove(head) # remove curent MutNode from children list of OrgNode
-			prev = head
-			head = head.r
-			del prev
+		# remove old nodes from OrgNode children lists. one pass over children of each affected OrgNode
+		victims = self._muts[i:j+1]
+		victims_by_parent = collections.defaultdict(set)
+		for victim in victims:
+			victims_by_parent[victim.parent].add(victim)
+		for parent, removed in victims_by_parent.items():
+			parent.children = [ kid for kid in parent.children if kid not in removed ]
 
 		# decrement bgn and end values for segments to right of deleted region
 		seg_len = end - bgn + 1
-		cur = newR
-		while cur != None:
+		muts = self._muts
+		for cur in muts[j+1:]:
 			cur.bgn -= seg_len
 			cur.end -= seg_len
-			cur = cur.r
 
-		self.n = self.n - (end - bgn + 1)
+		del muts[i:j+1]
+		bgns = self._bgns
+		bgns[i:] = [ b - seg_len for b in bgns[j+1:] ]
+
+		self.n -= seg_len
 		return True
 
 	# duplicate region from bgn to end. returns boolean for complete or not
 	def amp(self, bgn, end):
 		if not self._is_in_bounds(bgn, end) or not self._is_splitable(bgn, end):
 			return False
-		self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
-
-		insR, head, tail = _copy_from_to(self.mut, bgn, end) # copy list from bgn to end
+		i, j = self._2split(bgn, end) # split mutated and original list nodes at bgn and end positions
+		insR, head, tail = _copy_from_to(self._muts[i], bgn, end) # copy list from bgn to end
 		insL = insR.r # node to go after tail
 		insR.r = head
 		head.l = insR
 		tail.r = insL
-		if insL != None:
+		if insL is not None:
 			insL.l = tail
 
+		# copies sit directly after the copied region in the index
+		copies = []
+		cur = head
+		while cur is not insL:
+			copies.append(cur)
+			cur = cur.r
+		muts = self._muts
+		muts[j+1:j+1] = copies
+
 		# increment bgn and end values for inserted region and segments to right
 		seg_len = end - bgn + 1
-		while head != None:
-			head.bgn += seg_len
-			head.end += seg_len
-			head = head.r
+		for cur in muts[j+1:]:
+			cur.bgn += seg_len
+			cur.end += seg_len
+		self._bgns[j+1:] = [ m.bgn for m in muts[j+1:] ]
 
-		self.n = self.n + (end - bgn + 1)
+		self.n += seg_len
 		return True
 
 	# split bgn and end positions if needed. do not need to split at start or terminal of chromosome
+	# returns indices in self._muts of mutNode with bgn (head) and mutNode with end (tail)
 	def _2split(self, bgn, end):
 		n = self.n
 		if bgn > 0:
 			self._split(bgn)     # do not split if bgn is 0 (start of chrm)
 		if end + 1 < n:
 			self._split(end + 1) # do not split if end is n-1 (end of chrm)
+		i = self._mut_idx(bgn)
+		return i, self._mut_idx(end, i) # tail is at or after head
 
 	# splits node at position k in mut and org. k is bgn of right offspring
 	def _split(self, k):
@@ -164,9 +178,7 @@ class ChrmProf:
 			return
 
 		# find orgNode corresponding to the mutNode where split will occur
-		splitMut = self.mut
-		while splitMut != None and not (splitMut.bgn <= k and k <= splitMut.end):
-			splitMut = splitMut.r
+		splitMut = self._muts[self._mut_idx(k)]
 		orgNode1 = splitMut.parent
 
 		if splitMut.bgn == k or splitMut.end == k-1: # should not split b/c this was already split
@@ -178,9 +190,11 @@ class ChrmProf:
 		# split orgNode1 and all its children
 		orgNode2 = orgNode1.split(k)
 		for mutNode1 in orgNode1.children:
-			mutNode2 = mutNode1.split(k)
-			mutNode2.parent = orgNode2
+			mutNode2 = mutNode1.split(k, orgNode2)
 			orgNode2.children.append(mutNode2)
+			i = bisect.bisect_left(self._bgns, mutNode1.bgn) + 1 # new node goes right after its sibling
+			self._muts.insert(i, mutNode2)
+			self._bgns.insert(i, mutNode2.bgn)
 
 	def _is_in_bounds(self, bgn, end):
 		n = self.n
@@ -192,86 +206,99 @@ class ChrmProf:
 	# returns True if bgn and end do not match any positions already in mutated list
 	def _is_splitable(self, bgn, end):
 		n = self.n
-		if bgn != 0 and _is_already_mut_bgn(self.mut, bgn):
+		if bgn != 0 and self._is_already_mut_bgn(bgn):
 			return False
-		if end + 1 < n and _is_already_mut_end(self.mut, end):
+		if end + 1 < n and self._is_already_mut_end(end):
 			return False
 		return True
 
-	# returns original node that has a mutant at position pos
-	def _get_orgNode_mut_pos(pos):
-		cur = self.mut
-		while cur != None:
-			if cur.bgn >= pos and cur.end <= pos:
-				return cur.parent
-			cur = cur.r
-		return None
+	# returns True if bgn is already in mutNode list
+	def _is_already_mut_bgn(self, bgn):
+		return self._bgns[self._mut_idx(bgn)] == bgn
+	def _is_already_mut_end(self, end):
+		return self._muts[self._mut_idx(end)].end == end
 
-	# reverses doubly linked list starting from node with bgn of bgn to node with end of end
-	def _rev_mut(self, bgn, end):
+	# rebuilds index of mutNodes (self._muts) and their bgn positions (self._bgns) in list order
+	def _index_muts(self):
+		self._muts = []
 		cur = self.mut
-		while cur != None and cur.bgn != bgn: # node with bgn should exist
+		while cur is not None:
+			self._muts.append(cur)
 			cur = cur.r
-		ih = cur   # inner head
-		oh = cur.l # outer head
-		while cur != None and cur.end != end: # node with end should exist
-			cur = cur.r
-		it = cur   # inner tail
-		ot = cur.r # outer tail
+		self._bgns = [ m.bgn for m in self._muts ]
+
+	# returns index in self._muts of mutNode containing position pos. lo (int) is lowest index to search
+	def _mut_idx(self, pos, lo = 0):
+		return bisect.bisect_right(self._bgns, pos, lo) - 1
 
-		# set region bgn and end for calculating new positions of segments
-		rgbgn, rgend = ih.bgn, it.end
+	# returns original node that has a mutant at position pos
+	def _get_orgNode_mut_pos(self, pos):
+		if pos < 0 or pos >= self.n:
+			return None
+		return self._muts[self._mut_idx(pos)].parent
+
+	# reverses doubly linked list from node at index i to node at index j of self._muts
+	def _rev_mut(self, i, j):
+		ih = self._muts[i] # inner head
+		oh = ih.l          # outer head
+		it = self._muts[j] # inner tail
+		ot = it.r          # outer tail
+
+		# inverting reflects each segment about the region midpoint: new bgn is rgbgn + rgend - old end
+		#   and new end is rgbgn + rgend - old bgn. computed once for the whole region
+		refl = ih.bgn + it.end
 		
-		cur = ih
-		while cur != ot: # reverse linked list ih -> ... -> it
-			prv = cur.l
-			nxt = cur.r
-			cur.l = nxt
-			cur.r = prv
-			pos_diff = _get_inv_pos_diff(rgbgn, rgend, cur.bgn, cur.end)
-			cur.bgn += pos_diff
-			cur.end += pos_diff
+		for cur in self._muts[i:j+1]: # reverse linked list ih -> ... -> it
+			cur.l, cur.r = cur.r, cur.l
+			cur.bgn, cur.end = refl - cur.end, refl - cur.bgn
 			cur.is_inv = not cur.is_inv
-			cur = nxt
 
 		it.l = oh      # connect head and tail of internally reversed linked list to outer list
 		ih.r = ot
-		if oh != None:
+		if oh is not None:
 			oh.r = it
-		if ot != None:
+		if ot is not None:
 			ot.l = ih
 
-		if oh == None:
+		if oh is None:
 			self.mut = it # set head of mut if we inverted start of list
 
+	# builds whole output first so stdout is written and flushed once
 	def pprint(self):
-		printnow('lists:\n')
-		for lst_name, cur in {'org': self.org, 'mut': self.mut}.iteritems():
-			printnow(lst_name + ': ')
-			while cur != None:
-				cur.pprint()
+		out = ['lists:\n']
+		for lst_name, cur in {'org': self.org, 'mut': self.mut}.items():
+			out.append(lst_name + ': ')
+			while cur is not None:
+				out.append(cur.get_list_str())
 				cur = cur.r
-			printnow('\n')
-		printnow('relations:\n')
+			out.append('\n')
+		out.append('relations:\n')
 		cur = self.org
-		while cur != None:
+		while cur is not None:
 			kid_pos_strs = [ kid.get_pos_str() for kid in cur.children ]
-			printnow('[' + str(cur.bgn) + ',' + str(cur.end) + '] -> ' + ', '.join(kid_pos_strs) + '\n')
+			out.append('[' + str(cur.bgn) + ',' + str(cur.end) + '] -> ' + ', '.join(kid_pos_strs) + '\n')
 			cur = cur.r
-		printnow('copy numbers: ' + str(self.get_copy_nums()[2]) + '\n')
+		out.append('copy numbers: ' + str(self.get_copy_nums()[2]) + '\n')
+		printnow(''.join(out))
+
+class _Node(object):
+	__slots__ = ('bgn', 'end', 'l', 'r')
 
-class _Node:
 	def pprint(self):
+		printnow(self.get_list_str())
+	def get_list_str(self):
 		s = self.get_pos_str()
-		if self.r != None:
+		if self.r is not None:
 			s += '->'
 		else:
 			s += '-v'
-		printnow(s)
+		return s
 	def get_pos_str(self):
 		return '[' + str(self.bgn) + ',' + str(self.end) + ']'
 
 class _OrgNode(_Node):
+	__slots__ = ('children',)
+
 	def __init__(self, bgn, end):
 		self.children = [] # no mutated sections
 		self.l = None      # no left or right pointers
@@ -285,7 +312,7 @@ class _OrgNode(_Node):
 		self.r = _OrgNode(self.bgn + k, self.end)
 		self.r.r = r    # set right of new node to the old node's old right
 		self.r.l = self # set left of new node to old node (self)
-		if r != None:
+		if r is not None:
 			r.l = self.r
 		self.end = self.bgn + k - 1
 		return self.r
@@ -294,8 +321,10 @@ class _OrgNode(_Node):
 		return _OrgNode(self.bgn, self.end)
 
 class _MutNode(_Node):
-	def __init__(self, bgn, end, is_inv = False):
-		self.parent = None
+	__slots__ = ('parent', 'is_inv')
+
+	def __init__(self, bgn, end, is_inv = False, parent = None):
+		self.parent = parent # OrgNode this segment was copied from
 		self.l = None
 		self.r = None
 		self.bgn = bgn
@@ -303,15 +332,16 @@ class _MutNode(_Node):
 		self.is_inv = is_inv
 
 	def copy(self):
-		return _MutNode(self.bgn, self.end, self.is_inv)
+		return _MutNode(self.bgn, self.end, self.is_inv, self.parent)
 
 	# returns pointer to new sibling on right. k (int) means k + self.begin is bgn of new sibling
-	def split(self, k):
+	#   parent (OrgNode) is the OrgNode of the new sibling
+	def split(self, k, parent):
 		r = self.r
-		self.r = _MutNode(self.bgn + k, self.end, self.is_inv)
+		self.r = _MutNode(self.bgn + k, self.end, self.is_inv, parent)
 		self.r.r = r    # set right of new node to the old node's old right
 		self.r.l = self # set left of new node to old node (self)
-		if r != None:
+		if r is not None:
 			r.l = self.r
 		self.end = self.bgn + k - 1
 		return self.r
@@ -323,47 +353,21 @@ class _MutNode(_Node):
 
 # helpers
 
-# head is MutNode with bgn and tail is MutNode with end. must _2split() before so these exist!
-def _get_head_tail(cur, bgn, end):
-	while cur != None and cur.bgn != bgn:
-		cur = cur.r
-	head = cur
-	while cur != None and cur.end != end:
-		cur = cur.r
-	tail = cur
-	return head, tail
-
-# cur (mutNode). returns True if bgn is already in mutNode list
-def _is_already_mut_bgn(cur, bgn):
-	while cur != None:
-		if bgn == cur.bgn:
-			return True
-		cur = cur.r
-	return False
-def _is_already_mut_end(cur, end):
-	while cur != None:
-		if end == cur.end:
-			return True
-		cur = cur.r
-	return False
-
-# fm (int) is bgn index of one of the nodes. to (int) is end of one of the nodes
+# head (MutNode) is node with bgn of fm. to (int) is end of one of the nodes
 def _copy_from_to(head, fm, to):
 	oldhead = head
-	while head != None and head.bgn != fm: # make head the beggining of where to copy
-		head = head.r
 
 	curA = head
 	i = 0
 	prevB = None
-	while curA != None:
-		curB = copy.copy(curA)
+	while curA is not None:
+		curB = curA.copy()
 		curB.parent.children.append(curB) # update parent's children pointers
 		if i == 0:
 			headB = curB
 			i += 1
 		curB.l = prevB
-		if prevB != None:
+		if prevB is not None:
 			prevB.r = curB
 		curB.r = None
 		prevB = curB
@@ -373,25 +377,11 @@ def _copy_from_to(head, fm, to):
 	printerr('should not get here')
 	cur = oldhead
 	printnow('\n\n')
-	while cur != None:
+	while cur is not None:
 		cur.pprint()
 		cur = cur.r
 	printnow('\n\n')
 
-#  input: rgbgn (int) region beginning. position of bgn for first node of list to be inverted
-#         rgend (int) region ending.    position of end for last  node of list to be inverted
-#         sgbgn (int) segment beginning. bgn of current segment being flipped
-#         sgend (int) segment ending.    end of current segment being flipped
-# output: d (int) change in position to be applied to bgn and end of current node
-def _get_inv_pos_diff(rgbgn, rgend, sgbgn, sgend):
-	rglen = rgend - rgbgn + 1                            # region length
-	sglen = sgend - sgbgn + 1                            # segment length
-	mid = int(math.ceil(float(rglen) / 2.0) + rgbgn - 1) # position of midpoint of region
-	l = mid - sgend                                      # distance from midpoint to segment ending
-	if rglen % 2 == 0: # even
-		return 2 * l + sglen
-	return 2 * l + sglen - 1
-
 def tri_split_str(s, bgn, end):
 	s1 = s[:bgn]
 	s2 = s[bgn:end+1]
@@ -413,7 +403,7 @@ def _get_mated_pos(cur, isBgn):
 	if isBgn:
 		mate = cur.l
 
-	if mate == None:
+	if mate is None:
 		return None, None, None
 
 	curPos = _get_org_pos(cur, isBgn)
@@ -443,45 +433,42 @@ def _get_cur_pos(cur, isBgn):
 
 def _add_sv_to_dict(svs, cur, isBgn):
 	matePos, mateIsLeft, isAdj = _get_mated_pos(cur, isBgn)
-	curPos, curIsLeft = _get_cur_pos(cur, isBgn)
 	if matePos is None:
 		return
 
-	curTup = (curPos, curIsLeft)
+	curTup = _get_cur_pos(cur, isBgn) # (curPos, curIsLeft)
 	mateTup = (matePos, mateIsLeft)
 
-	
-	if curTup not in svs:
-		svs[curTup] = {'total_reads': 0, 'mated_reads': 0}
-
-	if mateTup not in svs:
-		svs[mateTup] = {'total_reads': 0, 'mated_reads': 0}
+	# one lookup per key. entries are only allocated the first time a key is seen
+	curSv = svs.get(curTup)
+	if curSv is None:
+		curSv = svs[curTup] = {'total_reads': 0, 'mated_reads': 0}
+	mateSv = svs.get(mateTup)
+	if mateSv is None:
+		mateSv = svs[mateTup] = {'total_reads': 0, 'mated_reads': 0}
 
-	svs[curTup]['total_reads'] += 1
+	curSv['total_reads'] += 1
 
 	if not isAdj:
-		svs[curTup]['mated_reads'] += 1
-		svs[curTup]['mate'] = mateTup
-		svs[mateTup]['mate'] = curTup
+		curSv['mated_reads'] += 1
+		curSv['mate'] = mateTup
+		mateSv['mate'] = curTup
 
 def _append_bp_copy_num(svs, mut_head):
 	cur = mut_head
-	while cur != None:
-		for isBgn in [True, False]:
-			curPos, curIsLeft = _get_cur_pos(cur, isBgn)
+	while cur is not None:
+		for isBgn in (True, False):
+			sv = svs.get(_get_cur_pos(cur, isBgn))
+			if sv is None:
+				continue
 			matPos, matIsLeft, _ = _get_mated_pos(cur, isBgn)
-			curTup = (curPos, curIsLeft)
-			matTup = (matPos, matIsLeft)
-			if curTup in svs and svs[curTup]['mate'] == matTup:
-				if 'copy_num' not in svs[curTup]:
-					svs[curTup]['copy_num'] = 0
-				svs[curTup]['copy_num'] += 1
+			if sv['mate'] == (matPos, matIsLeft):
+				sv['copy_num'] = sv.get('copy_num', 0) + 1
 		cur = cur.r
 
 	# add copy number of zeros for breakpoints that were deleted
-	for tup, val in svs.iteritems():
-		if 'copy_num' not in val:
-			svs[tup]['copy_num'] = 0
+	for val in svs.values():
+		val.setdefault('copy_num', 0)
 
 #
 #   DEEP COPY
@@ -495,13 +482,13 @@ def _deepcopy_org(headA):
 	i = 0
 	prvB = None
 	muts = []
-	while curA != None:
+	while curA is not None:
 		curB = curA.copy()
 		if i == 0:
 			headB = curB
 			i += 1
 		curB.l = prvB
-		if prvB != None:
+		if prvB is not None:
 			prvB.r = curB
 		prvB = curB
 